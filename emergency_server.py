@@ -2,28 +2,387 @@
 """
 EMERGENCY BACKUP SERVER - App Marketing Automation Hub
 Simple HTTP server for immediate demo deployment
+
+Run with --production to serve concurrent clients from an in-memory
+file cache with ETag/Last-Modified revalidation and HTTP keep-alive.
+Production mode also builds precompressed .gz/.br variants of the demo
+assets at startup (or offline with --precompress) and negotiates them
+from Accept-Encoding.
 """
 
+import argparse
+import email.utils
+import gzip
 import http.server
-import socketserver
+import io
+import json
 import os
+import socketserver
 import sys
+import threading
+import time
+import urllib.parse
 import webbrowser
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from threading import Timer
 
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Directories and files walked by the precompression stage
+PRECOMPRESS_ROOTS = [
+    'emergency_demo.html',
+    'analytics_dashboard',
+    'website',
+    'content_templates',
+    'appfinder_content_templates',
+]
+PRECOMPRESS_EXTENSIONS = ('.html', '.js', '.css', '.json', '.svg', '.txt')
+PRECOMPRESS_MIN_BYTES = 256
+PRECOMPRESSED_DIR = '.precompressed'
+
+# Template directories served by /content-templates, with the category used
+# for files directly inside them (subdirectories name their own category)
+TEMPLATE_ROOTS = [
+    ('content_templates', 'general'),
+    ('appfinder_content_templates', 'appfinder'),
+]
+TEMPLATE_PAGE_SIZE = 20
+TEMPLATE_MAX_PAGE_SIZE = 100
+
+# Preferred first; only encodings with an available codec are built
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+def available_encodings():
+    return [(name, ext) for name, ext in ENCODINGS if name != 'br' or brotli]
+
+def variant_path(root, rel, ext):
+    return os.path.join(root, PRECOMPRESSED_DIR, rel + ext)
+
+def _compress_file(src, variants):
+    """Write every stale compressed variant of `src`; runs in a worker."""
+    st = os.stat(src)
+    with open(src, 'rb') as f:
+        data = f.read()
+    written = []
+    for name, dst in variants:
+        if name == 'br':
+            payload = brotli.compress(data, quality=11)
+        else:
+            payload = gzip.compress(data, compresslevel=9, mtime=0)
+        if len(payload) >= len(data):
+            # Not worth serving; drop any earlier variant so it is not used
+            if os.path.exists(dst):
+                os.remove(dst)
+            continue
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        tmp = dst + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(payload)
+        # Stamp the variant with the source mtime so staleness is one stat
+        os.utime(tmp, ns=(st.st_atime_ns, st.st_mtime_ns))
+        os.replace(tmp, dst)
+        written.append(dst)
+    return written
+
+def _iter_precompress_sources(root, roots):
+    for entry in roots:
+        top = os.path.join(root, entry)
+        if os.path.isfile(top):
+            yield top
+            continue
+        for dirpath, _, filenames in os.walk(top):
+            for filename in filenames:
+                yield os.path.join(dirpath, filename)
+
+def precompress_assets(root, roots=PRECOMPRESS_ROOTS, workers=None):
+    """Build compressed variants of the served assets under PRECOMPRESSED_DIR.
+
+    Files whose variants already carry the source mtime are skipped, so
+    re-running only pays for what changed. Returns (written, skipped).
+    """
+    encodings = available_encodings()
+    jobs = []
+    skipped = 0
+    for src in _iter_precompress_sources(root, roots):
+        if not src.endswith(PRECOMPRESS_EXTENSIONS):
+            continue
+        st = os.stat(src)
+        if st.st_size < PRECOMPRESS_MIN_BYTES:
+            continue
+        rel = os.path.relpath(src, root)
+        stale = []
+        for name, ext in encodings:
+            dst = variant_path(root, rel, ext)
+            try:
+                if os.stat(dst).st_mtime_ns == st.st_mtime_ns:
+                    continue
+            except OSError:
+                pass
+            stale.append((name, dst))
+        if stale:
+            jobs.append((src, stale))
+        else:
+            skipped += 1
+
+    written = []
+    if jobs:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_compress_file, src, stale) for src, stale in jobs]
+            for future in futures:
+                written.extend(future.result())
+    return written, skipped
+
+def parse_accept_encoding(header):
+    """Return {coding: q} for every content coding listed in the header.
+
+    Codings refused with q=0 are kept, so a '*' entry cannot accept them.
+    """
+    qvalues = {}
+    for item in (header or '').split(','):
+        parts = item.strip().split(';')
+        coding = parts[0].strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in parts[1:]:
+            key, _, value = param.strip().partition('=')
+            if key.strip() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        qvalues[coding] = q
+    return qvalues
+
+class FileCache:
+    """Thread-safe LRU cache of file bytes, bounded by total size.
+
+    Entries are keyed by path and validated against the file's mtime and
+    size on every lookup, so edits on disk are picked up immediately.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, max_entry_bytes=1024 * 1024):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.total_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def cacheable(self, st):
+        return st.st_size <= self.max_entry_bytes
+
+    def get(self, path, st):
+        """Return the bytes of `path`, reading from disk only when stale.
+
+        `st` only decides whether the cached copy is fresh; a re-read entry
+        is stamped from os.fstat() of the file it was read from, so a file
+        replaced after `st` was taken is re-read on the next lookup.
+        """
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == (st.st_mtime_ns, st.st_size):
+                self._entries.move_to_end(path)
+                return entry[1]
+
+        with open(path, 'rb') as f:
+            fst = os.fstat(f.fileno())
+            data = f.read()
+
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self.total_bytes -= len(old[1])
+            self._entries[path] = ((fst.st_mtime_ns, fst.st_size), data)
+            self.total_bytes += len(data)
+            while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.total_bytes -= len(evicted)
+        return data
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+class TemplateIndex:
+    """In-memory index of the JSON content templates.
+
+    Templates are loaded once and indexed by path, id, category and platform.
+    Records are keyed by path, so files sharing a template id are all
+    listed; a lookup by id returns the one with the first path.
+    refresh() polls file mtimes and re-parses only files that changed, so
+    queries never touch the disk.
+    """
+
+    def __init__(self, root, roots=TEMPLATE_ROOTS):
+        self.root = root
+        self.roots = roots
+        self._files = {}  # path -> (mtime_ns, size)
+        self._templates = {}  # path -> record
+        self._by_id = {}  # id -> {paths}
+        self._by_category = {}  # category -> {paths}
+        self._by_platform = {}  # platform -> {paths}
+        self._ordered = []  # paths sorted by (id, path)
+        self._lock = threading.Lock()
+        self._poller = None
+
+    def _scan(self):
+        for directory, default_category in self.roots:
+            top = os.path.join(self.root, directory)
+            for dirpath, _, filenames in os.walk(top):
+                rel_dir = os.path.relpath(dirpath, top)
+                category = default_category if rel_dir == '.' else rel_dir.split(os.sep)[0]
+                for filename in filenames:
+                    if filename.endswith('.json'):
+                        yield os.path.join(dirpath, filename), category
+
+    def _load_file(self, path, category):
+        try:
+            with open(path, 'rb') as f:
+                template = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(template, dict) or not isinstance(template.get('id'), str):
+            # Schemas and other non-template JSON have no id
+            return None
+        platform = template.get('platform') or []
+        if isinstance(platform, str):
+            platform = [platform]
+        body = json.dumps(template, ensure_ascii=False).encode('utf-8')
+        return {
+            'summary': {
+                'id': template['id'],
+                'type': template.get('type'),
+                'category': category,
+                'platform': platform,
+                'path': os.path.relpath(path, self.root).replace(os.sep, '/'),
+            },
+            'body': body,
+            'etag': '"tpl-%x"' % zlib.crc32(body),
+        }
+
+    def _add(self, path, record):
+        summary = record['summary']
+        self._templates[path] = record
+        self._by_id.setdefault(summary['id'], set()).add(path)
+        self._by_category.setdefault(summary['category'], set()).add(path)
+        for platform in summary['platform']:
+            self._by_platform.setdefault(platform, set()).add(path)
+
+    def _remove(self, path):
+        record = self._templates.pop(path, None)
+        if record is None:
+            return
+        summary = record['summary']
+        for index, key in ((self._by_id, summary['id']),
+                           (self._by_category, summary['category'])):
+            paths = index.get(key, set())
+            paths.discard(path)
+            if not paths:
+                index.pop(key, None)
+        for platform in summary['platform']:
+            paths = self._by_platform.get(platform, set())
+            paths.discard(path)
+            if not paths:
+                self._by_platform.pop(platform, None)
+
+    def refresh(self):
+        """Re-index changed, added and removed files; return True on change."""
+        seen = set()
+        changes = []
+        for path, category in self._scan():
+            seen.add(path)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            stamp = (st.st_mtime_ns, st.st_size)
+            if self._files.get(path) != stamp:
+                changes.append((path, stamp, self._load_file(path, category)))
+        removed = [path for path in self._files if path not in seen]
+        if not changes and not removed:
+            return False
+
+        with self._lock:
+            for path in removed:
+                del self._files[path]
+                self._remove(path)
+            for path, stamp, record in changes:
+                self._remove(path)
+                if record is not None:
+                    self._add(path, record)
+                self._files[path] = stamp
+            self._ordered = sorted(
+                self._templates,
+                key=lambda path: (self._templates[path]['summary']['id'], path))
+        return True
+
+    def start_polling(self, interval=2.0):
+        """Refresh from a daemon thread every `interval` seconds."""
+        if self._poller is not None:
+            return
+
+        def poll():
+            while True:
+                time.sleep(interval)
+                self.refresh()
+
+        self._poller = threading.Thread(target=poll, daemon=True)
+        self._poller.start()
+
+    def __len__(self):
+        return len(self._templates)
+
+    def get(self, template_id):
+        with self._lock:
+            paths = self._by_id.get(template_id)
+            return self._templates[min(paths)] if paths else None
+
+    def query(self, category=None, platform=None, type=None, offset=0,
+              limit=TEMPLATE_PAGE_SIZE):
+        """Return a page of template summaries matching every given filter."""
+        with self._lock:
+            candidates = None
+            for index, key in ((self._by_category, category),
+                               (self._by_platform, platform)):
+                if key is not None:
+                    paths = index.get(key, set())
+                    candidates = paths if candidates is None else candidates & paths
+            matches = [
+                self._templates[path]['summary'] for path in self._ordered
+                if (candidates is None or path in candidates)
+                and (type is None or self._templates[path]['summary']['type'] == type)
+            ]
+        return {
+            'total': len(matches),
+            'offset': offset,
+            'limit': limit,
+            'items': matches[offset:offset + limit],
+        }
+
+_template_index_lock = threading.Lock()
+
 class EmergencyHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
+    cache_control = 'no-cache, no-store, must-revalidate'
+    template_index = None
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, directory=os.getcwd(), **kwargs)
-    
+
     def end_headers(self):
         # Add CORS headers for local development
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', '*')
         # Cache control for development
-        self.send_header('Cache-Control', 'no-cache, no-store, must-revalidate')
+        self.send_header('Cache-Control', self.cache_control)
         super().end_headers()
-    
+
     def do_GET(self):
         # Route handling for demo
         if self.path == '/':
@@ -32,22 +391,249 @@ class EmergencyHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
             self.path = '/analytics_dashboard/index.html'
         elif self.path == '/website':
             self.path = '/website/index.html'
-        elif self.path.startswith('/content-templates'):
-            # Serve content templates with proper MIME type
-            self.send_response(200)
-            self.send_header('Content-Type', 'application/json')
-            self.end_headers()
+        elif self.path.split('?', 1)[0].rstrip('/') == '/content-templates' \
+                or self.path.startswith('/content-templates/'):
+            self.send_templates()
             return
-        
+
         super().do_GET()
 
+    def get_template_index(self):
+        """The shared TemplateIndex for the served directory, built once."""
+        index = EmergencyHTTPRequestHandler.template_index
+        if index is None or index.root != self.directory:
+            with _template_index_lock:
+                index = EmergencyHTTPRequestHandler.template_index
+                if index is None or index.root != self.directory:
+                    index = TemplateIndex(self.directory)
+                    index.refresh()
+                    EmergencyHTTPRequestHandler.template_index = index
+        return index
+
+    def send_templates(self):
+        """GET /content-templates[?category=&platform=&type=&offset=&limit=]
+        and GET /content-templates/<id>, answered from the TemplateIndex."""
+        index = self.get_template_index()
+        parsed = urllib.parse.urlsplit(self.path)
+        template_id = urllib.parse.unquote(parsed.path[len('/content-templates'):].strip('/'))
+
+        if template_id:
+            record = index.get(template_id)
+            if record is None:
+                self.send_json(404, {'error': f'Unknown template: {template_id}'})
+                return
+            self.send_json(200, record['body'], record['etag'])
+            return
+
+        params = urllib.parse.parse_qs(parsed.query)
+        filters = {key: params[key][-1] for key in ('category', 'platform', 'type')
+                   if key in params}
+        try:
+            offset = int(params.get('offset', ['0'])[-1])
+            limit = int(params.get('limit', [str(TEMPLATE_PAGE_SIZE)])[-1])
+        except ValueError:
+            self.send_json(400, {'error': 'offset and limit must be integers'})
+            return
+        if offset < 0 or not 0 < limit <= TEMPLATE_MAX_PAGE_SIZE:
+            self.send_json(400, {'error': f'offset must be >= 0 and limit in '
+                                          f'1..{TEMPLATE_MAX_PAGE_SIZE}'})
+            return
+
+        page = index.query(offset=offset, limit=limit, **filters)
+        body = json.dumps(page, ensure_ascii=False).encode('utf-8')
+        # Derived from the page itself, so it changes with the content and
+        # stays valid across restarts
+        etag = '"tpls-%x-%x"' % (len(body), zlib.crc32(body))
+        self.send_json(200, body, etag)
+
+    def send_json(self, status, payload, etag=None):
+        if etag is not None and etag in [
+                tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')]:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        body = payload if isinstance(payload, bytes) else \
+            json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        if etag is not None:
+            self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+class ProductionHTTPRequestHandler(EmergencyHTTPRequestHandler):
+    """Production mode: cached, revalidating, keep-alive static serving.
+
+    Small files are served from a shared FileCache; files larger than the
+    cache's per-entry limit are streamed with sendfile.
+    """
+
+    protocol_version = 'HTTP/1.1'
+    # Seconds a kept-alive or slow client may leave its socket idle before
+    # the connection, and the thread serving it, is dropped
+    timeout = 15
+    # Headers and body go out in separate writes on kept-alive sockets
+    disable_nagle_algorithm = True
+    cache_control = 'no-cache'
+    file_cache = FileCache()
+
+    def send_head(self):
+        path = self.translate_path(self.path)
+        if os.path.isdir(path):
+            index = os.path.join(path, 'index.html')
+            if not self.path.split('?', 1)[0].endswith('/') or not os.path.isfile(index):
+                # Trailing-slash redirects and listings stay with the stdlib handler
+                return super().send_head()
+            path = index
+        try:
+            st = os.stat(path)
+        except OSError:
+            return super().send_head()
+        content_type = self.guess_type(path)
+
+        compressible = path.endswith(PRECOMPRESS_EXTENSIONS)
+        encoding = None
+        if compressible:
+            encoding, variant, variant_st = self._select_variant(path, st)
+            if encoding is not None:
+                path, body_st = variant, variant_st
+        if encoding is None:
+            body_st = st
+
+        etag = '"%x-%x%s"' % (st.st_mtime_ns, st.st_size,
+                              '-' + encoding if encoding else '')
+        if self._not_modified(etag, st):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            if compressible:
+                self.send_header('Vary', 'Accept-Encoding')
+            self.end_headers()
+            return None
+
+        # Content-Length must describe the body actually sent, which may
+        # differ from the stat above if the file changed in between
+        if self.file_cache.cacheable(body_st):
+            try:
+                data = self.file_cache.get(path, body_st)
+            except OSError:
+                self.send_error(404, 'File not found')
+                return None
+            f = io.BytesIO(data)
+            self._body_length = len(data)
+        else:
+            try:
+                f = open(path, 'rb')
+            except OSError:
+                self.send_error(404, 'File not found')
+                return None
+            self._body_length = os.fstat(f.fileno()).st_size
+
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(self._body_length))
+        if compressible:
+            self.send_header('Vary', 'Accept-Encoding')
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Last-Modified', self.date_time_string(st.st_mtime))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        return f
+
+    def _select_variant(self, path, st):
+        """Pick the best fresh precompressed variant the client accepts."""
+        qvalues = parse_accept_encoding(self.headers.get('Accept-Encoding'))
+        if not qvalues:
+            return None, None, None
+        rel = os.path.relpath(path, self.directory)
+        best = None
+        # The client's highest q wins; ENCODINGS order only breaks ties
+        for name, ext in ENCODINGS:
+            # An explicit q=0 refuses the coding even when '*' is accepted
+            q = qvalues.get(name, qvalues.get('*', 0.0))
+            if q <= 0 or (best and q <= best[0]):
+                continue
+            variant = variant_path(self.directory, rel, ext)
+            try:
+                variant_st = os.stat(variant)
+            except OSError:
+                continue
+            # Variants carry their source's mtime; anything else is stale
+            if variant_st.st_mtime_ns == st.st_mtime_ns:
+                best = (q, name, variant, variant_st)
+        if best is None:
+            return None, None, None
+        return best[1:]
+
+    def _not_modified(self, etag, st):
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None:
+            tags = [tag.strip() for tag in if_none_match.split(',')]
+            return '*' in tags or etag in tags or 'W/' + etag in tags
+
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since is not None:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError, IndexError, OverflowError):
+                return False
+            if since is None:
+                return False
+            return int(st.st_mtime) <= since.timestamp()
+        return False
+
+    def copyfile(self, source, outputfile):
+        if isinstance(source, io.BytesIO):
+            outputfile.write(source.getbuffer())
+            return
+        self.wfile.flush()
+        sent = self.connection.sendfile(source, count=self._body_length)
+        if sent != self._body_length:
+            # The file shrank after Content-Length went out; the framing is
+            # broken, so the connection cannot be reused
+            self.close_connection = True
+
+class ProductionHTTPServer(http.server.ThreadingHTTPServer):
+    allow_reuse_address = True
+    request_queue_size = 128
+
 def open_browser():
     """Open browser after server starts"""
-    webbrowser.open('http://localhost:3000')
+    webbrowser.open(f'http://localhost:{PORT}')
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Emergency demo server')
+    parser.add_argument('--port', type=int, default=3000)
+    parser.add_argument('--production', action='store_true',
+                        help='threaded server with cached, revalidating responses')
+    parser.add_argument('--no-browser', action='store_true',
+                        help='do not open a browser window on startup')
+    parser.add_argument('--precompress', action='store_true',
+                        help='build .gz/.br asset variants and exit')
+    return parser.parse_args(argv)
+
+def make_server(port, production=False):
+    if production:
+        return ProductionHTTPServer(("", port), ProductionHTTPRequestHandler)
+    return socketserver.TCPServer(("", port), EmergencyHTTPRequestHandler)
+
+PORT = 3000
+
+def main(argv=None):
+    global PORT
+    args = parse_args(argv)
+    PORT = args.port
+
+    if args.precompress or args.production:
+        written, skipped = precompress_assets(os.getcwd())
+        codecs = ', '.join(name for name, _ in available_encodings())
+        print(f"🗜️  Precompressed {len(written)} variants ({codecs}), "
+              f"{skipped} files unchanged")
+        if args.precompress:
+            return
 
-def main():
-    PORT = 3000
-    
     print("🚨 EMERGENCY BACKUP SERVER - App Marketing Automation Hub")
     print("=" * 60)
     print(f"🚀 Starting emergency demo server on port {PORT}")
@@ -55,35 +641,42 @@ def main():
     print(f"🌐 Website: http://localhost:{PORT}/website")
     print(f"📄 Main Demo: http://localhost:{PORT}")
     print("=" * 60)
-    
+
     try:
-        with socketserver.TCPServer(("", PORT), EmergencyHTTPRequestHandler) as httpd:
+        with make_server(PORT, args.production) as httpd:
             print(f"✅ Emergency server running at http://localhost:{PORT}")
-            print("🔄 Auto-opening browser in 2 seconds...")
-            
-            # Auto-open browser after 2 seconds
-            Timer(2.0, open_browser).start()
-            
+            if not args.no_browser:
+                print("🔄 Auto-opening browser in 2 seconds...")
+                # Auto-open browser after 2 seconds
+                Timer(2.0, open_browser).start()
+
             print("📱 Mobile responsive design enabled")
             print("⚡ CORS enabled for development")
+            if args.production:
+                print("🏎️  Production mode: threaded, cached, keep-alive")
+            index = TemplateIndex(os.getcwd())
+            index.refresh()
+            index.start_polling()
+            EmergencyHTTPRequestHandler.template_index = index
+            print(f"📚 Indexed {len(index)} content templates")
             print("🛡️  Serving all marketing automation demo content")
             print("\n👆 Press Ctrl+C to stop server")
             print("=" * 60)
-            
+
             httpd.serve_forever()
-            
+
     except KeyboardInterrupt:
         print("\n🛑 Emergency server stopped")
         sys.exit(0)
     except OSError as e:
-        if e.errno == 98:  # Address already in use
+        if e.errno == 98 and PORT == 3000:  # Address already in use
             print(f"❌ Port {PORT} is already in use")
             print("🔄 Trying alternative port 3001...")
-            PORT = 3001
-            main()
+            args_list = list(argv if argv is not None else sys.argv[1:])
+            main(args_list + ['--port', '3001'])
         else:
             print(f"❌ Server error: {e}")
             sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
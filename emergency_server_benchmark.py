@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+EMERGENCY SERVER BENCHMARK - App Marketing Automation Hub
+Load-tests the development handler against --production mode
+
+Both servers run in-process on ephemeral ports and are hit by the same
+pool of client threads. Reports requests/sec and p50/p99 latency.
+With --compression, reports bytes on the wire and time-to-first-byte for
+the demo pages per negotiated Content-Encoding instead. With --templates,
+compares TemplateIndex lookups against re-reading the template files.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+
+import emergency_server
+
+DEMO_PATHS = [
+    '/',
+    '/dashboard',
+    '/website',
+    '/analytics_dashboard/css/dashboard.css',
+    '/analytics_dashboard/js/dashboard.js',
+    '/website/css/main.css',
+    '/website/js/main.js',
+]
+
+def start_server(production):
+    if production:
+        httpd = emergency_server.ProductionHTTPServer(
+            ('127.0.0.1', 0), emergency_server.ProductionHTTPRequestHandler)
+    else:
+        # The handler as shipped before --production: one request at a time
+        httpd = socketserver.TCPServer(
+            ('127.0.0.1', 0), emergency_server.EmergencyHTTPRequestHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    return httpd
+
+def client(port, paths, count, latencies, revalidate):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    etags = {}
+    for i in range(count):
+        path = paths[i % len(paths)]
+        headers = {}
+        if revalidate and path in etags:
+            headers['If-None-Match'] = etags[path]
+        start = time.perf_counter()
+        conn.request('GET', path, headers=headers)
+        response = conn.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - start)
+        if response.getheader('ETag'):
+            etags[path] = response.getheader('ETag')
+        if response.will_close:
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    conn.close()
+
+def run(port, concurrency, requests, revalidate=False):
+    per_client = max(1, requests // concurrency)
+    latencies = []
+    threads = [
+        threading.Thread(target=client,
+                         args=(port, DEMO_PATHS, per_client, latencies, revalidate))
+        for _ in range(concurrency)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'rps': len(latencies) / elapsed,
+        'p50': latencies[len(latencies) // 2] * 1000,
+        'p99': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+    }
+
+def report(name, result):
+    print(f"{name:<28} {result['requests']:>7} req  {result['rps']:>9.0f} req/s  "
+          f"p50 {result['p50']:>7.2f} ms  p99 {result['p99']:>7.2f} ms")
+
+def fetch_raw(port, path, accept_encoding):
+    """GET `path` over a fresh socket; return (wire bytes, ttfb, total) seconds."""
+    request = f'GET {path} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n'
+    if accept_encoding:
+        request += f'Accept-Encoding: {accept_encoding}\r\n'
+    request += '\r\n'
+    with socket.create_connection(('127.0.0.1', port)) as sock:
+        start = time.perf_counter()
+        sock.sendall(request.encode('ascii'))
+        chunk = sock.recv(65536)
+        ttfb = time.perf_counter() - start
+        received = len(chunk)
+        while chunk:
+            chunk = sock.recv(65536)
+            received += len(chunk)
+        return received, ttfb, time.perf_counter() - start
+
+def compression_report(rounds):
+    emergency_server.precompress_assets(os.getcwd())
+    httpd = start_server(True)
+    port = httpd.server_address[1]
+    encodings = [('identity', None), ('gzip', 'gzip')]
+    if emergency_server.brotli:
+        encodings.append(('br', 'br, gzip'))
+    try:
+        print(f"{'page':<40} {'encoding':<9} {'bytes':>8} {'ttfb ms':>8} {'total ms':>9}")
+        for path in DEMO_PATHS:
+            for name, accept in encodings:
+                fetch_raw(port, path, accept)  # warm the file cache
+                samples = [fetch_raw(port, path, accept) for _ in range(rounds)]
+                wire = samples[0][0]
+                ttfb = sorted(sample[1] for sample in samples)[rounds // 2] * 1000
+                total = sorted(sample[2] for sample in samples)[rounds // 2] * 1000
+                print(f"{path:<40} {name:<9} {wire:>8} {ttfb:>8.3f} {total:>9.3f}")
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+TEMPLATE_QUERIES = [
+    {},
+    {'platform': 'instagram'},
+    {'category': 'social_media'},
+    {'category': 'appfinder', 'platform': 'etsy'},
+    {'type': 'email_template'},
+]
+
+def query_from_disk(root, category=None, platform=None, type=None):
+    """What /content-templates would cost without an index: read everything."""
+    matches = []
+    index = emergency_server.TemplateIndex(root)
+    for path, file_category in index._scan():
+        with open(path, 'rb') as f:
+            template = json.load(f)
+        if not isinstance(template, dict) or 'id' not in template:
+            continue
+        platforms = template.get('platform') or []
+        if category is not None and file_category != category:
+            continue
+        if platform is not None and platform not in platforms:
+            continue
+        if type is not None and template.get('type') != type:
+            continue
+        matches.append(template['id'])
+    return sorted(matches)
+
+def templates_report(rounds):
+    root = os.getcwd()
+    start = time.perf_counter()
+    index = emergency_server.TemplateIndex(root)
+    index.refresh()
+    build = time.perf_counter() - start
+    print(f"index build: {build * 1000:.2f} ms for {len(index)} templates")
+    print(f"{'query':<45} {'disk us':>10} {'index us':>10} {'speedup':>8}")
+    for query in TEMPLATE_QUERIES:
+        expected = query_from_disk(root, **query)
+        page = index.query(limit=emergency_server.TEMPLATE_MAX_PAGE_SIZE, **query)
+        assert [item['id'] for item in page['items']] == expected, query
+
+        start = time.perf_counter()
+        for _ in range(rounds):
+            query_from_disk(root, **query)
+        disk = (time.perf_counter() - start) / rounds
+        start = time.perf_counter()
+        for _ in range(rounds):
+            index.query(**query)
+        indexed = (time.perf_counter() - start) / rounds
+        label = ', '.join(f'{k}={v}' for k, v in query.items()) or '(all)'
+        print(f"{label:<45} {disk * 1e6:>10.1f} {indexed * 1e6:>10.1f} "
+              f"{disk / indexed:>7.0f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=4000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--compression', action='store_true',
+                        help='report wire bytes and TTFB per Content-Encoding')
+    parser.add_argument('--templates', action='store_true',
+                        help='compare indexed template lookups with disk reads')
+    args = parser.parse_args()
+
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    # Keep request logging off the measured path
+    emergency_server.EmergencyHTTPRequestHandler.log_message = lambda *a: None
+
+    if args.compression:
+        print("📦 EMERGENCY SERVER COMPRESSION BENCHMARK")
+        print("=" * 60)
+        compression_report(rounds=25)
+        return
+
+    if args.templates:
+        print("📚 CONTENT TEMPLATE LOOKUP BENCHMARK")
+        print("=" * 60)
+        templates_report(rounds=200)
+        return
+
+    print("📈 EMERGENCY SERVER BENCHMARK")
+    print("=" * 60)
+    print(f"{args.requests} requests, {args.concurrency} concurrent clients")
+    print("=" * 60)
+
+    scenarios = [
+        ('current (single-threaded)', lambda: start_server(False), False),
+        ('production', lambda: start_server(True), False),
+        ('production + revalidation', lambda: start_server(True), True),
+    ]
+    for name, start, revalidate in scenarios:
+        httpd = start()
+        try:
+            report(name, run(httpd.server_address[1], args.concurrency,
+                             args.requests, revalidate))
+        finally:
+            httpd.shutdown()
+            httpd.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+"""
+Unit tests for emergency_server.py
+
+Run with: python -m unittest emergency_server_test
+"""
+
+import gzip
+import http.client
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import emergency_server
+
+
+class FileCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'page.html')
+        self.write(b'first')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def write(self, data, mtime_ns=None):
+        with open(self.path, 'wb') as f:
+            f.write(data)
+        if mtime_ns is not None:
+            os.utime(self.path, ns=(mtime_ns, mtime_ns))
+
+    def test_hit_does_not_reread(self):
+        cache = emergency_server.FileCache()
+        st = os.stat(self.path)
+        self.assertEqual(b'first', cache.get(self.path, st))
+        os.remove(self.path)
+        self.assertEqual(b'first', cache.get(self.path, st))
+
+    def test_changed_file_is_reread(self):
+        cache = emergency_server.FileCache()
+        cache.get(self.path, os.stat(self.path))
+        self.write(b'second version', mtime_ns=10 ** 18)
+        self.assertEqual(b'second version', cache.get(self.path, os.stat(self.path)))
+
+    def test_entry_is_stamped_from_the_file_read(self):
+        cache = emergency_server.FileCache()
+        stale = os.stat(self.path)
+        # The file changes between the caller's stat and the read
+        self.write(b'a longer body', mtime_ns=10 ** 18)
+        self.assertEqual(b'a longer body', cache.get(self.path, stale))
+        fresh = os.stat(self.path)
+        os.remove(self.path)
+        # Cached under the stamp of what was read, not the stale stat
+        self.assertEqual(b'a longer body', cache.get(self.path, fresh))
+        self.assertRaises(OSError, cache.get, self.path, stale)
+
+    def test_evicts_least_recently_used(self):
+        cache = emergency_server.FileCache(max_bytes=10)
+        paths = []
+        for name in 'abc':
+            path = os.path.join(self.tmp, name)
+            with open(path, 'wb') as f:
+                f.write(b'x' * 4)
+            paths.append(path)
+        for path in paths:
+            cache.get(path, os.stat(path))
+        self.assertEqual(8, cache.total_bytes)
+        os.remove(paths[0])
+        self.assertRaises(OSError, cache.get, paths[0], os.stat(paths[1]))
+
+
+class ServerTestCase(unittest.TestCase):
+    """Serves a temporary directory with the production handler."""
+
+    handler_class = emergency_server.ProductionHTTPRequestHandler
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp)
+        emergency_server.ProductionHTTPRequestHandler.file_cache = \
+            emergency_server.FileCache(max_entry_bytes=1024)
+        emergency_server.EmergencyHTTPRequestHandler.template_index = None
+        self.httpd = emergency_server.ProductionHTTPServer(
+            ('127.0.0.1', 0), self.handler_class)
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        self.conn = http.client.HTTPConnection(
+            '127.0.0.1', self.httpd.server_address[1], timeout=10)
+
+    def tearDown(self):
+        self.conn.close()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        emergency_server.EmergencyHTTPRequestHandler.template_index = None
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmp)
+
+    def write(self, rel, data):
+        path = os.path.join(self.tmp, rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def get(self, path, **headers):
+        self.conn.request('GET', path, headers=headers)
+        response = self.conn.getresponse()
+        return response, response.read()
+
+
+class ProductionServingTest(ServerTestCase):
+    def test_cached_and_streamed_bodies_match_content_length(self):
+        self.write('small.txt', b'small body')
+        self.write('large.txt', b'L' * 5000)
+        # Both requests go over one kept-alive connection
+        for path, body in (('/small.txt', b'small body'), ('/large.txt', b'L' * 5000)):
+            response, data = self.get(path)
+            self.assertEqual(200, response.status)
+            self.assertEqual(body, data)
+            self.assertEqual(str(len(body)), response.getheader('Content-Length'))
+
+    def test_revalidation(self):
+        self.write('page.html', b'<p>page</p>')
+        response, _ = self.get('/page.html')
+        etag = response.getheader('ETag')
+        response, data = self.get('/page.html', **{'If-None-Match': etag})
+        self.assertEqual(304, response.status)
+        self.assertEqual(b'', data)
+        response, _ = self.get('/page.html', **{'If-None-Match': '"other"'})
+        self.assertEqual(200, response.status)
+        response, _ = self.get(
+            '/page.html',
+            **{'If-Modified-Since': response.getheader('Last-Modified')})
+        self.assertEqual(304, response.status)
+
+
+class QuickTimeoutHandler(emergency_server.ProductionHTTPRequestHandler):
+    timeout = 0.2
+
+    def log_message(self, format, *args):
+        pass
+
+
+class IdleConnectionTest(ServerTestCase):
+    handler_class = QuickTimeoutHandler
+
+    def test_idle_kept_alive_connection_is_closed(self):
+        self.assertGreater(emergency_server.ProductionHTTPRequestHandler.timeout, 0)
+        self.write('page.html', b'<p>page</p>')
+        response, _ = self.get('/page.html')
+        self.assertEqual(200, response.status)
+        self.assertFalse(response.will_close)
+        # The server hangs up instead of waiting for a next request
+        self.conn.sock.settimeout(5)
+        self.assertEqual(b'', self.conn.sock.recv(1))
+
+
+class AcceptEncodingTest(unittest.TestCase):
+    def test_parse(self):
+        self.assertEqual({}, emergency_server.parse_accept_encoding(None))
+        self.assertEqual(
+            {'gzip': 1.0, 'br': 0.5, 'deflate': 0.0, '*': 0.0},
+            emergency_server.parse_accept_encoding(
+                'gzip, BR;q=0.5 ,deflate;q=x, *;q=0'))
+
+
+class NegotiationTest(ServerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.body = b'<p>compress me</p>' * 100
+        self.source = self.write('site/page.html', self.body)
+        emergency_server.precompress_assets(self.tmp, roots=['site'], workers=1)
+
+    def encoding(self, accept_encoding):
+        response, data = self.get('/site/page.html',
+                                  **{'Accept-Encoding': accept_encoding})
+        self.assertEqual(200, response.status)
+        self.assertEqual('Accept-Encoding', response.getheader('Vary'))
+        encoding = response.getheader('Content-Encoding')
+        if encoding == 'gzip':
+            data = gzip.decompress(data)
+        elif encoding == 'br':
+            data = emergency_server.brotli.decompress(data)
+        self.assertEqual(self.body, data)
+        return encoding
+
+    def test_accepted_variant_is_served(self):
+        self.assertEqual('gzip', self.encoding('gzip'))
+        self.assertEqual('gzip', self.encoding('deflate, gzip;q=0.5'))
+        self.assertIsNone(self.encoding(''))
+        self.assertIsNone(self.encoding('identity'))
+        if emergency_server.brotli is None:
+            self.skipTest('brotli is not installed')
+        # The client's q-values rank the codings, server order breaks ties
+        self.assertEqual('gzip', self.encoding('br;q=0.1, gzip;q=1'))
+        self.assertEqual('br', self.encoding('gzip;q=0.5, br'))
+        self.assertEqual('br', self.encoding('gzip, br'))
+
+    def test_refused_coding_is_not_accepted_by_wildcard(self):
+        self.assertNotEqual('gzip', self.encoding('gzip;q=0, *'))
+        self.assertNotEqual('gzip', self.encoding('*, gzip;q=0'))
+        self.assertIsNone(self.encoding('*;q=0'))
+        self.assertIsNone(self.encoding('br;q=0, gzip;q=0, *'))
+
+    def test_stale_variant_is_not_served(self):
+        os.utime(self.source, ns=(10 ** 18, 10 ** 18))
+        self.assertIsNone(self.encoding('gzip'))
+
+    def test_variants_have_their_own_etag(self):
+        response, _ = self.get('/site/page.html', **{'Accept-Encoding': 'gzip'})
+        etag = response.getheader('ETag')
+        response, _ = self.get('/site/page.html', **{'If-None-Match': etag})
+        self.assertEqual(200, response.status)
+        self.assertNotEqual(etag, response.getheader('ETag'))
+        response, _ = self.get('/site/page.html', **{'Accept-Encoding': 'gzip',
+                                                     'If-None-Match': etag})
+        self.assertEqual(304, response.status)
+
+
+def write_template(root, rel, template, mtime_ns=None):
+    path = os.path.join(root, rel)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(template, f)
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+    return path
+
+
+class TemplateIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        write_template(self.tmp, 'content_templates/welcome.json',
+                       {'id': 'welcome', 'type': 'email', 'platform': 'email'})
+        write_template(self.tmp, 'content_templates/social/launch.json',
+                       {'id': 'launch', 'type': 'post',
+                        'platform': ['twitter', 'instagram']})
+        write_template(self.tmp, 'appfinder_content_templates/promo.json',
+                       {'id': 'promo', 'type': 'post', 'platform': 'twitter'})
+        write_template(self.tmp, 'content_templates/schema.json', {'type': 'object'})
+        self.index = emergency_server.TemplateIndex(self.tmp)
+        self.assertTrue(self.index.refresh())
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def ids(self, **filters):
+        return [item['id'] for item in self.index.query(**filters)['items']]
+
+    def test_query(self):
+        self.assertEqual(3, len(self.index))
+        self.assertEqual(['launch', 'promo', 'welcome'], self.ids())
+        self.assertEqual(['welcome'], self.ids(category='general'))
+        self.assertEqual(['launch'], self.ids(category='social'))
+        self.assertEqual(['launch', 'promo'], self.ids(platform='twitter'))
+        self.assertEqual(['promo'], self.ids(platform='twitter', category='appfinder'))
+        self.assertEqual(['launch', 'promo'], self.ids(type='post'))
+        self.assertEqual([], self.ids(category='missing'))
+        page = self.index.query(offset=1, limit=1)
+        self.assertEqual((3, ['promo']), (page['total'], [i['id'] for i in page['items']]))
+
+    def test_refresh(self):
+        self.assertFalse(self.index.refresh())
+        write_template(self.tmp, 'content_templates/welcome.json',
+                       {'id': 'welcome', 'type': 'email', 'platform': 'sms'},
+                       mtime_ns=10 ** 18)
+        os.remove(os.path.join(self.tmp, 'appfinder_content_templates/promo.json'))
+        write_template(self.tmp, 'content_templates/added.json', {'id': 'added'})
+        self.assertTrue(self.index.refresh())
+        self.assertEqual(['added', 'launch', 'welcome'], self.ids())
+        self.assertEqual(['welcome'], self.ids(platform='sms'))
+        self.assertEqual([], self.ids(platform='email'))
+        self.assertEqual(['launch'], self.ids(platform='twitter'))
+        self.assertIsNone(self.index.get('promo'))
+
+    def test_duplicate_ids(self):
+        write_template(self.tmp, 'content_templates/social/welcome.json',
+                       {'id': 'welcome', 'type': 'post', 'platform': 'twitter'})
+        self.index.refresh()
+        self.assertEqual(['launch', 'promo', 'welcome', 'welcome'], self.ids())
+        for item in self.index.query(category='general')['items']:
+            self.assertEqual('general', item['category'])
+        self.assertEqual(['welcome'], self.ids(category='general'))
+        self.assertEqual(['launch', 'welcome'], self.ids(category='social'))
+        self.assertEqual(['launch', 'promo', 'welcome'], self.ids(platform='twitter'))
+        # The first path wins lookups by id
+        self.assertEqual('content_templates/social/welcome.json',
+                         self.index.get('welcome')['summary']['path'])
+
+        # Removing either file leaves the other one indexed
+        os.remove(os.path.join(self.tmp, 'content_templates/social/welcome.json'))
+        self.index.refresh()
+        self.assertEqual('content_templates/welcome.json',
+                         self.index.get('welcome')['summary']['path'])
+        self.assertEqual(['welcome'], self.ids(category='general'))
+        self.assertEqual(['launch'], self.ids(category='social'))
+        self.assertEqual(['launch', 'promo'], self.ids(platform='twitter'))
+
+
+class TemplateEndpointTest(ServerTestCase):
+    def setUp(self):
+        super().setUp()
+        write_template(self.tmp, 'content_templates/welcome.json',
+                       {'id': 'welcome', 'type': 'email'})
+
+    def restart(self):
+        """Drop the index, as a server restart would."""
+        emergency_server.EmergencyHTTPRequestHandler.template_index = None
+
+    def test_template_by_id(self):
+        response, data = self.get('/content-templates/welcome')
+        self.assertEqual(200, response.status)
+        self.assertEqual({'id': 'welcome', 'type': 'email'}, json.loads(data))
+        etag = response.getheader('ETag')
+        response, _ = self.get('/content-templates/welcome', **{'If-None-Match': etag})
+        self.assertEqual(304, response.status)
+        response, _ = self.get('/content-templates/missing')
+        self.assertEqual(404, response.status)
+
+    def test_list_etag_follows_content(self):
+        response, data = self.get('/content-templates?category=general')
+        self.assertEqual(['welcome'], [i['id'] for i in json.loads(data)['items']])
+        etag = response.getheader('ETag')
+        response, _ = self.get('/content-templates?category=general',
+                               **{'If-None-Match': etag})
+        self.assertEqual(304, response.status)
+
+        # The same content after a restart keeps the same ETag
+        self.restart()
+        response, _ = self.get('/content-templates?category=general',
+                               **{'If-None-Match': etag})
+        self.assertEqual(304, response.status)
+
+        # Changed content after a restart must not revalidate
+        write_template(self.tmp, 'content_templates/other.json', {'id': 'other'})
+        self.restart()
+        response, data = self.get('/content-templates?category=general',
+                                  **{'If-None-Match': etag})
+        self.assertEqual(200, response.status)
+        self.assertEqual(2, json.loads(data)['total'])
+        self.assertNotEqual(etag, response.getheader('ETag'))
+
+    def test_bad_paging(self):
+        response, _ = self.get('/content-templates?limit=0')
+        self.assertEqual(400, response.status)
+        response, _ = self.get('/content-templates?offset=x')
+        self.assertEqual(400, response.status)
+
+
+class RewritingHandler(emergency_server.ProductionHTTPRequestHandler):
+    """Replaces the file after send_head has stat()ed it, before the read."""
+
+    replacements = {}
+
+    def guess_type(self, path):
+        data = self.replacements.pop(os.path.basename(path), None)
+        if data is not None:
+            with open(path, 'wb') as f:
+                f.write(data)
+        return super().guess_type(path)
+
+
+class ChangedFileTest(ServerTestCase):
+    handler_class = RewritingHandler
+
+    def test_content_length_matches_body_read(self):
+        cases = [
+            ('small.txt', b'small', b'small, then longer'),
+            ('large.txt', b'L' * 5000, b'S' * 3000),
+            ('grown.txt', b'G' * 3000, b'G' * 6000),
+        ]
+        for name, before, after in cases:
+            self.write(name, before)
+            RewritingHandler.replacements[name] = after
+            # Every request reuses the kept-alive connection, which only
+            # works if each Content-Length matched its body
+            response, data = self.get('/' + name)
+            self.assertEqual(after, data)
+            self.assertEqual(str(len(after)), response.getheader('Content-Length'))
+        response, data = self.get('/small.txt')
+        self.assertEqual(b'small, then longer', data)
+
+
+if __name__ == '__main__':
+    unittest.main()